@@ -0,0 +1,203 @@
+"""Admission control for inference, shared by flask_app.py and asgi_app.py.
+
+Both front-ends take their limits, deadline parsing, shed responses and stats from
+here so they cannot drift apart. AdmissionController waits for a slot on a thread
+condition (Flask); AsyncAdmission is the same gate on an asyncio condition (ASGI).
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+
+# Admission control for /predict (override via environment)
+PREDICT_MAX_CONCURRENT = int(os.environ.get('PREDICT_MAX_CONCURRENT', '4'))
+PREDICT_MAX_QUEUE = int(os.environ.get('PREDICT_MAX_QUEUE', '32'))
+PREDICT_TIMEOUT_MS = int(os.environ.get('PREDICT_TIMEOUT_MS', '10000'))
+PREDICT_RETRY_AFTER = int(os.environ.get('PREDICT_RETRY_AFTER', '1'))
+# clients can send their own budget (milliseconds) so we stop working once they have given up
+DEADLINE_HEADER = 'X-Request-Timeout-Ms'
+
+# shed status -> (HTTP status, error message); both carry SHED_HEADERS
+SHED_RESPONSES = {
+    'queue_full': (429, 'server busy, retry later'),
+    'expired': (503, 'request deadline exceeded before inference'),
+}
+SHED_HEADERS = {'Retry-After': str(PREDICT_RETRY_AFTER)}
+
+
+def timeout_from_header(raw):
+    """The client's budget if it sent a usable one, clamped to [0, PREDICT_TIMEOUT_MS]; else the default."""
+    if raw:
+        try:
+            timeout_ms = float(raw)
+        except ValueError:
+            return PREDICT_TIMEOUT_MS
+        # nan would compare false against every deadline and never expire
+        if math.isfinite(timeout_ms):
+            return min(max(timeout_ms, 0.0), PREDICT_TIMEOUT_MS)
+    return PREDICT_TIMEOUT_MS
+
+
+def deadline_from_header(raw):
+    """time.monotonic() deadline for a request given its DEADLINE_HEADER value (or None)."""
+    return time.monotonic() + timeout_from_header(raw) / 1000.0
+
+
+class AdmissionCounters:
+    """Limits plus admitted/shed/queue-time counters; callers serialize access themselves."""
+
+    def __init__(self, max_concurrent=PREDICT_MAX_CONCURRENT, max_queue=PREDICT_MAX_QUEUE):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_expired = 0
+        self.queue_time_total = 0.0
+        self.queue_time_max = 0.0
+
+    def record_admitted(self, waited):
+        self.admitted += 1
+        self.queue_time_total += waited
+        self.queue_time_max = max(self.queue_time_max, waited)
+
+    def record_shed(self, status):
+        if status == 'queue_full':
+            self.shed_queue_full += 1
+        else:
+            self.shed_expired += 1
+
+    def snapshot(self, running, waiting):
+        return {
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            'running': running,
+            'waiting': waiting,
+            'admitted': self.admitted,
+            'shed_queue_full': self.shed_queue_full,
+            'shed_expired': self.shed_expired,
+            'queue_ms_avg': (self.queue_time_total / self.admitted * 1000.0) if self.admitted else 0.0,
+            'queue_ms_max': self.queue_time_max * 1000.0,
+        }
+
+
+class AdmissionController(AdmissionCounters):
+    """Bounded concurrency gate in front of inference, for threaded servers.
+
+    At most `max_concurrent` requests run the model at once and up to `max_queue`
+    more wait for a slot. Anything beyond that is shed immediately, and waiters
+    whose deadline passes are dropped before they reach the model.
+    """
+
+    def __init__(self, max_concurrent=PREDICT_MAX_CONCURRENT, max_queue=PREDICT_MAX_QUEUE):
+        super().__init__(max_concurrent, max_queue)
+        self._cond = threading.Condition()
+        self._running = 0
+        self._waiting = 0
+
+    def acquire(self, deadline):
+        """Wait for a slot until `deadline` (time.monotonic() seconds).
+        Returns 'ok', 'queue_full' or 'expired'; only 'ok' must be paired with release().
+        """
+        start = time.monotonic()
+        with self._cond:
+            if self._running >= self.max_concurrent and self._waiting >= self.max_queue:
+                self.record_shed('queue_full')
+                return 'queue_full'
+            self._waiting += 1
+            try:
+                while self._running >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            now = time.monotonic()
+            if now >= deadline:
+                self.record_shed('expired')
+                # we may have consumed a wake-up meant for a slot; hand it to the next waiter
+                self._cond.notify()
+                return 'expired'
+            self._running += 1
+            self.record_admitted(now - start)
+            return 'ok'
+
+    def release(self):
+        with self._cond:
+            self._running -= 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return self.snapshot(self._running, self._waiting)
+
+
+class AsyncAdmission(AdmissionCounters):
+    """Event-loop counterpart of AdmissionController, with the same queue and deadline rules.
+
+    Requests wait for a slot on the event loop, so a waiter whose deadline passes leaves
+    the queue (and gets its 503) at that deadline; only admitted calls are submitted to
+    `executor`. All state is touched on the loop thread.
+    """
+
+    def __init__(self, executor, max_concurrent=PREDICT_MAX_CONCURRENT, max_queue=PREDICT_MAX_QUEUE):
+        super().__init__(max_concurrent, max_queue)
+        self.executor = executor
+        # created on first use, inside the loop that serves requests
+        self._cond = None
+        self._running = 0
+        self._waiting = 0
+
+    def _condition(self):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def acquire(self, deadline):
+        """Async AdmissionController.acquire(); only 'ok' must be paired with release()."""
+        cond = self._condition()
+        start = time.monotonic()
+        async with cond:
+            if self._running >= self.max_concurrent and self._waiting >= self.max_queue:
+                self.record_shed('queue_full')
+                return 'queue_full'
+            self._waiting += 1
+            try:
+                while self._running >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        await asyncio.wait_for(cond.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._waiting -= 1
+            now = time.monotonic()
+            if now >= deadline:
+                self.record_shed('expired')
+                cond.notify()
+                return 'expired'
+            self._running += 1
+            self.record_admitted(now - start)
+            return 'ok'
+
+    async def release(self):
+        cond = self._condition()
+        async with cond:
+            self._running -= 1
+            cond.notify()
+
+    async def run(self, deadline, fn, *args):
+        """Run fn(*args) in the executor once admitted. Returns (status, result)."""
+        status = await self.acquire(deadline)
+        if status != 'ok':
+            return status, None
+        try:
+            return status, await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            await self.release()
+
+    def stats(self):
+        return self.snapshot(self._running, self._waiting)
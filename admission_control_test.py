@@ -0,0 +1,136 @@
+"""Check the /predict admission gates: queue limit, deadlines and slot hand-over.
+
+admission_control.AdmissionController (Flask) and AsyncAdmission (ASGI) are pure
+Python, so this runs without a model.
+Timings are a few hundred milliseconds; slow machines only make the margins larger.
+
+Usage:
+  python admission_control_test.py
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from admission_control import (
+    PREDICT_TIMEOUT_MS, AdmissionController, AsyncAdmission, deadline_from_header, timeout_from_header,
+)
+
+
+def in_thread(fn, *args):
+    """Start fn(*args) in a thread; returns (thread, result dict filled with 'value' and 'at')."""
+    out = {}
+
+    def target():
+        out['value'] = fn(*args)
+        out['at'] = time.monotonic()
+    t = threading.Thread(target=target, daemon=True)
+    t.start()
+    return t, out
+
+
+def check_queue_full():
+    gate = AdmissionController(max_concurrent=1, max_queue=1)
+    assert gate.acquire(time.monotonic() + 5) == 'ok'
+    waiter, result = in_thread(gate.acquire, time.monotonic() + 5)
+    time.sleep(0.05)
+    assert gate.acquire(time.monotonic() + 5) == 'queue_full', 'third request must be shed (429)'
+    gate.release()
+    waiter.join(1)
+    assert result['value'] == 'ok'
+    gate.release()
+    stats = gate.stats()
+    assert (stats['admitted'], stats['shed_queue_full'], stats['running']) == (2, 1, 0), stats
+    print('queue_full once max_concurrent + max_queue are taken')
+
+
+def check_expired():
+    gate = AdmissionController(max_concurrent=1, max_queue=4)
+    assert gate.acquire(time.monotonic() + 5) == 'ok'
+    start = time.monotonic()
+    waiter, result = in_thread(gate.acquire, start + 0.1)
+    waiter.join(1)
+    assert result['value'] == 'expired', 'waiter past its deadline must be dropped (503)'
+    assert result['at'] - start < 0.5, 'expired waiter must return at its deadline, not when the slot frees'
+    gate.release()
+    assert gate.stats()['shed_expired'] == 1
+    print('expired at the deadline while the slot is still taken')
+
+
+def check_release_hands_over():
+    gate = AdmissionController(max_concurrent=1, max_queue=1)
+    assert gate.acquire(time.monotonic() + 5) == 'ok'
+    waiter, result = in_thread(gate.acquire, time.monotonic() + 5)
+    time.sleep(0.1)
+    assert 'value' not in result and gate.stats()['waiting'] == 1
+    released = time.monotonic()
+    gate.release()
+    waiter.join(1)
+    assert result['value'] == 'ok' and result['at'] - released < 0.5, 'release must wake the waiter'
+    assert gate.stats()['running'] == 1
+    gate.release()
+    print('release hands the slot to the next waiter')
+
+
+def check_deadline_header():
+    assert timeout_from_header(None) == PREDICT_TIMEOUT_MS
+    assert timeout_from_header('abc') == PREDICT_TIMEOUT_MS
+    assert timeout_from_header('nan') == PREDICT_TIMEOUT_MS
+    assert timeout_from_header('-5') == 0.0
+    assert timeout_from_header('250') == 250.0
+    assert timeout_from_header(str(PREDICT_TIMEOUT_MS * 10)) == PREDICT_TIMEOUT_MS
+    assert deadline_from_header('0') <= time.monotonic()
+    print('deadline header parsed, clamped, and non-finite values ignored')
+
+
+async def async_expired_frees_queue():
+    # one 1 s job holds the only slot, two waiters on 100 ms deadlines fill the queue
+    executor = ThreadPoolExecutor(max_workers=1)
+    gate = AsyncAdmission(executor, max_concurrent=1, max_queue=2)
+    start = time.monotonic()
+    running = asyncio.ensure_future(gate.run(start + 5, time.sleep, 1.0))
+    await asyncio.sleep(0.05)
+
+    async def waiter():
+        status, _ = await gate.run(time.monotonic() + 0.1, time.sleep, 0)
+        return status, time.monotonic() - start
+    waiters = [asyncio.ensure_future(waiter()) for _ in range(2)]
+    await asyncio.sleep(0.25)
+    # by 300 ms both waiters have left the queue with 503 at their deadline
+    for w in waiters:
+        assert w.done(), 'expired waiter still queued'
+        status, at = w.result()
+        assert status == 'expired' and at < 0.5, (status, at)
+    assert gate.stats()['waiting'] == 0, gate.stats()
+    # so a new request is queued instead of being shed, and runs once the job finishes
+    status, _ = await gate.run(time.monotonic() + 5, time.sleep, 0)
+    assert status == 'ok', status
+    assert (await running)[0] == 'ok'
+    stats = gate.stats()
+    assert (stats['admitted'], stats['shed_expired'], stats['shed_queue_full'], stats['running']) == (2, 2, 0, 0), stats
+    executor.shutdown()
+
+
+async def async_queue_full():
+    executor = ThreadPoolExecutor(max_workers=1)
+    gate = AsyncAdmission(executor, max_concurrent=1, max_queue=1)
+    jobs = [asyncio.ensure_future(gate.run(time.monotonic() + 5, time.sleep, 0.2)) for _ in range(2)]
+    await asyncio.sleep(0.05)
+    assert await gate.run(time.monotonic() + 5, time.sleep, 0) == ('queue_full', None)
+    assert [status for status, _ in await asyncio.gather(*jobs)] == ['ok', 'ok']
+    executor.shutdown()
+
+
+def check_async_gate():
+    asyncio.run(async_expired_frees_queue())
+    asyncio.run(async_queue_full())
+    print('async gate drops expired waiters at their deadline and sheds like the threaded one')
+
+
+if __name__ == '__main__':
+    check_queue_full()
+    check_expired()
+    check_release_hands_over()
+    check_deadline_header()
+    check_async_gate()
+    print('OK')
@@ -10,6 +10,7 @@ Usage examples:
   python app.py --no-install # don't run pip install
   python app.py --train     # force running hhe.py even if model exists
   python app.py --port 5000 # set port for Flask server
+  python app.py --asgi      # serve with the async front-end (asgi_app.py) instead of Flask
 
 This script tries to run commands using the current Python interpreter. On Windows,
 if you want to use the venv, activate it before running this script.
@@ -27,6 +28,7 @@ parser = argparse.ArgumentParser()
 parser.add_argument('--no-install', action='store_true', help='skip pip install')
 parser.add_argument('--train', action='store_true', help='force training (run hhe.py)')
 parser.add_argument('--port', type=int, default=5000, help='port for Flask app')
+parser.add_argument('--asgi', action='store_true', help='start the async front-end (asgi_app.py) instead of Flask')
 parser.add_argument('--no-venv', action='store_true', help='do not create/use a .venv; run in the current interpreter')
 parser.add_argument('--create-venv', action='store_true', help='create a .venv if missing')
 parser.add_argument('--venv-path', type=str, default='.venv', help='path to virtualenv folder (default: .venv)')
@@ -74,6 +76,11 @@ if args.train or not MODEL.exists():
 else:
     print('Model exists, skipping training.')
 
+if args.asgi:
+    print('Starting async app (asgi_app.py) on port', args.port)
+    subprocess.check_call([use_python, str(ROOT / 'asgi_app.py'), '--port', str(args.port)])
+    sys.exit(0)
+
 # Start the Flask app
 env = dict(**dict())
 print('Starting Flask app (flask_app.py) on port', args.port)
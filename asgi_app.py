@@ -0,0 +1,159 @@
+"""Async (ASGI) serving front-end for the sentiment model.
+
+Serves the same routes as flask_app.py on an event loop, so idle keep-alive chat
+connections cost a socket instead of a worker thread. Tokenization, rules, the
+model and the session store are imported from flask_app.py; only blocking work
+(inference, file reads, the prediction log) is pushed to executors.
+
+Usage:
+  python asgi_app.py --port 8000
+  uvicorn asgi_app:app --port 8000
+"""
+import argparse
+import asyncio
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from admission_control import (
+    DEADLINE_HEADER, PREDICT_MAX_CONCURRENT, SHED_HEADERS, SHED_RESPONSES, AsyncAdmission, deadline_from_header,
+)
+from flask_app import (
+    dashboard_page, history_payload, index_page, inference_stats, load_recent_predictions,
+    log_prediction, predict_session_text, predict_text, sessions,
+)
+from http_cache import conditional_response
+
+KEEP_ALIVE_S = int(os.environ.get('ASGI_KEEP_ALIVE_S', '75'))
+
+# inference gets its own pool so slow model calls never starve file/log I/O on the default one
+inference_executor = ThreadPoolExecutor(max_workers=PREDICT_MAX_CONCURRENT, thread_name_prefix='inference')
+
+
+admission = AsyncAdmission(inference_executor)
+
+
+async def read_text(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return None, {}
+    return (data.get('text') or '').strip(), data
+
+
+async def run_admitted(request, fn, *args):
+    status, result = await admission.run(deadline_from_header(request.headers.get(DEADLINE_HEADER)), fn, *args)
+    if status != 'ok':
+        code, error = SHED_RESPONSES[status]
+        return None, JSONResponse({'error': error}, status_code=code, headers=SHED_HEADERS)
+    return result, None
+
+
+def _scored(fn):
+    # RuntimeError means the model/word index are missing; report it like flask_app does
+    def call(*args):
+        try:
+            return fn(*args), None
+        except RuntimeError as e:
+            return None, str(e)
+    return call
+
+
+async def predict(request):
+    text, _ = await read_text(request)
+    if not text:
+        return JSONResponse({'error': 'empty text'}, status_code=400)
+    scored, shed = await run_admitted(request, _scored(predict_text), text)
+    if shed is not None:
+        return shed
+    result, error = scored
+    if error:
+        return JSONResponse({'error': error}, status_code=500)
+    await asyncio.get_running_loop().run_in_executor(None, log_prediction, text, result)
+    return JSONResponse(result)
+
+
+async def predict_session(request):
+    text, data = await read_text(request)
+    if not text:
+        return JSONResponse({'error': 'empty text'}, status_code=400)
+    conversation_id = str(data.get('conversation_id') or uuid.uuid4().hex)
+    scored, shed = await run_admitted(request, _scored(predict_session_text), conversation_id, text)
+    if shed is not None:
+        return shed
+    result, error = scored
+    if error:
+        return JSONResponse({'error': error}, status_code=500)
+    await asyncio.get_running_loop().run_in_executor(None, log_prediction, text, result['message'])
+    return JSONResponse(result)
+
+
+async def end_session(request):
+    conversation_id = request.path_params['conversation_id']
+    return JSONResponse({'conversation_id': conversation_id, 'dropped': sessions.drop(conversation_id)})
+
+
+def cached_response(request, payload):
+    # current() is a stat() on the hot path; the rare rebuild is small enough to do inline
+    status, headers, body = conditional_response(payload.current(), request.headers)
+    return Response(body, status_code=status, headers=headers)
+
+
+async def index(request):
+    return cached_response(request, index_page)
+
+
+async def dashboard(request):
+    return cached_response(request, dashboard_page)
+
+
+async def api_history(request):
+    return cached_response(request, history_payload)
+
+
+async def api_predictions(request):
+    return JSONResponse(await asyncio.get_running_loop().run_in_executor(None, load_recent_predictions))
+
+
+async def api_admission(request):
+    return JSONResponse(admission.stats())
+
+
+async def api_inference(request):
+    return JSONResponse(inference_stats.stats())
+
+
+async def api_sessions(request):
+    return JSONResponse(sessions.stats())
+
+
+app = Starlette(routes=[
+    Route('/', index),
+    Route('/dashboard', dashboard),
+    Route('/predict', predict, methods=['POST']),
+    Route('/predict/session', predict_session, methods=['POST']),
+    Route('/predict/session/{conversation_id}', end_session, methods=['DELETE']),
+    Route('/api/history', api_history),
+    Route('/api/predictions', api_predictions),
+    Route('/api/admission', api_admission),
+    Route('/api/inference', api_inference),
+    Route('/api/sessions', api_sessions),
+])
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    p = argparse.ArgumentParser()
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8000)
+    args = p.parse_args()
+    # long keep-alive so idle chat clients hold their connection instead of reconnecting;
+    # a deep accept backlog absorbs connection bursts
+    uvicorn.run(app, host=args.host, port=args.port, timeout_keep_alive=KEEP_ALIVE_S, backlog=4096)
@@ -0,0 +1,358 @@
+"""Pluggable CPU inference backends for the sentiment model.
+
+Every backend loads from sentiment_model.h5 and exposes
+    predict_batch(x: int32 array of shape (n, MAXLEN)) -> float array of shape (n,)
+
+  keras        tensorflow.keras load_model + predict_on_batch (the original path)
+  tf_function  the Keras model traced once as a tf.function with a fixed input signature
+  tflite       converted to sentiment_model.tflite (batch 1) and run with the TFLite interpreter
+  numpy        weights exported to sentiment_model.npz and run by numpy_lstm.NumpyLSTM;
+               no TensorFlow import once the export exists
+
+Derived files (.tflite, .npz) are regenerated when the .h5's content changes: each has a
+.json stamp next to it recording the SHA-256 of the model it came from, so restoring an
+older model with its original mtime (cp -p, rsync -a, a release tarball) is still caught.
+
+The serving default comes from $INFERENCE_BACKEND, else from backend.json written by
+the benchmark, else keras. Run the benchmark on each machine type:
+  python backends.py --bench           # measure all backends, print the table
+  python backends.py --bench --write   # ...and save the fastest agreeing one as default
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from evaluate import file_sha256
+from numpy_lstm import NumpyLSTM
+
+ROOT = Path(__file__).parent
+MODEL_PATH = ROOT / 'sentiment_model.h5'
+BACKEND_CHOICE_PATH = ROOT / 'backend.json'
+MAXLEN = 200
+TOP_WORDS = 10000
+DEFAULT_BACKEND = 'keras'
+BENCH_BATCH_SIZES = (1, 8, 64)
+# backends whose outputs differ from keras by more than this are never picked as default
+AGREEMENT_TOL = 1e-3
+
+
+def _load_keras(model_path):
+    try:
+        from tensorflow.keras.models import load_model
+    except Exception:
+        from keras.models import load_model
+    return load_model(str(model_path))
+
+
+def _source_key(model_path, maxlen):
+    return {'model_sha256': file_sha256(model_path), 'maxlen': maxlen}
+
+
+def _stamp_path(derived):
+    return derived.with_name(derived.name + '.json')
+
+
+def _stale(derived, key):
+    stamp = _stamp_path(derived)
+    if not derived.exists() or not stamp.exists():
+        return True
+    try:
+        return json.loads(stamp.read_text(encoding='utf-8')) != key
+    except ValueError:
+        return True
+
+
+# one export at a time per process; the atomic rename covers other processes (e.g. gunicorn workers)
+_export_lock = threading.Lock()
+
+
+def _atomic_write(path, write):
+    """Write via `write(fileobj)` to a temp file next to `path`, then swap it in with os.replace."""
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    try:
+        with open(tmp, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def _export(derived, model_path, maxlen, write):
+    """Regenerate `derived` with `write(fileobj)` unless its stamp matches the model's content."""
+    with _export_lock:
+        key = _source_key(model_path, maxlen)
+        if _stale(derived, key):
+            _atomic_write(derived, write)
+            # stamp last: a crash in between leaves a stale stamp, never a wrong one
+            _atomic_write(_stamp_path(derived), lambda f: f.write(json.dumps(key).encode('utf-8')))
+    return derived
+
+
+def ensure_tflite(model_path=MODEL_PATH, maxlen=MAXLEN):
+    """Path of the .tflite conversion of the model, (re)converting it if the .h5 changed."""
+    def write(f):
+        f.write(TFLiteBackend.convert(model_path, maxlen))
+    return _export(Path(model_path).with_suffix('.tflite'), model_path, maxlen, write)
+
+
+def ensure_npz(model_path=MODEL_PATH, maxlen=MAXLEN):
+    """Path of the NumPy weight export of the model, (re)exporting it if the .h5 changed (needs Keras)."""
+    def write(f):
+        NumpyLSTM.from_keras(_load_keras(model_path), maxlen=maxlen).save(f)
+    return _export(Path(model_path).with_suffix('.npz'), model_path, maxlen, write)
+
+
+class KerasBackend:
+    name = 'keras'
+
+    def __init__(self, model_path, maxlen=MAXLEN):
+        self.model = _load_keras(model_path)
+
+    def predict_batch(self, x):
+        return np.asarray(self.model.predict_on_batch(x)).reshape(-1)
+
+
+class TFFunctionBackend:
+    name = 'tf_function'
+
+    def __init__(self, model_path, maxlen=MAXLEN):
+        import tensorflow as tf
+        model = _load_keras(model_path)
+        # fixed signature: one trace for every batch size, no per-call Keras predict overhead
+        self._fn = tf.function(lambda x: model(x, training=False),
+                               input_signature=[tf.TensorSpec([None, maxlen], tf.int32)])
+        self._fn.get_concrete_function()
+
+    def predict_batch(self, x):
+        return self._fn(x).numpy().reshape(-1)
+
+
+class TFLiteBackend:
+    name = 'tflite'
+
+    def __init__(self, model_path, maxlen=MAXLEN):
+        tflite_path = ensure_tflite(model_path, maxlen)
+        # standalone runtimes first (LiteRT, then the older tflite_runtime); full TensorFlow last
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tflite_runtime.interpreter import Interpreter
+            except ImportError:
+                import tensorflow as tf
+                Interpreter = tf.lite.Interpreter
+        self._interp = Interpreter(model_path=str(tflite_path))
+        self._interp.allocate_tensors()
+        self._input = self._interp.get_input_details()[0]['index']
+        self._output = self._interp.get_output_details()[0]['index']
+        # the interpreter keeps its tensors in place, so calls must not overlap
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def convert(model_path, maxlen=MAXLEN):
+        # The LSTM only lowers to TFLite builtins with a static batch dimension (a dynamic one
+        # needs Select TF ops / the Flex delegate), and the fused graph cannot be resized later,
+        # so the model is converted for batch 1 and predict_batch feeds rows one at a time.
+        import tensorflow as tf
+        try:
+            from tensorflow.keras.layers import Input
+            from tensorflow.keras.models import Model
+        except Exception:
+            from keras.layers import Input
+            from keras.models import Model
+        model = _load_keras(model_path)
+        inp = Input(shape=(maxlen,), batch_size=1, dtype='int32')
+        return tf.lite.TFLiteConverter.from_keras_model(Model(inp, model(inp))).convert()
+
+    def predict_batch(self, x):
+        x = np.ascontiguousarray(x, dtype=np.int32)
+        out = np.empty(x.shape[0], dtype=np.float32)
+        with self._lock:
+            for i in range(x.shape[0]):
+                self._interp.set_tensor(self._input, x[i:i + 1])
+                self._interp.invoke()
+                out[i] = self._interp.get_tensor(self._output).reshape(-1)[0]
+        return out
+
+
+class NumpyBackend:
+    name = 'numpy'
+
+    def __init__(self, model_path, maxlen=MAXLEN):
+        self.lstm = load_numpy_lstm(model_path, maxlen)
+
+    def predict_batch(self, x):
+        return self.lstm.predict_batch(x)
+
+
+BACKENDS = {b.name: b for b in (KerasBackend, TFFunctionBackend, TFLiteBackend, NumpyBackend)}
+
+
+def load_numpy_lstm(model_path=MODEL_PATH, maxlen=MAXLEN):
+    """NumpyLSTM for the model, exporting its weights to .npz the first time (needs Keras once)."""
+    return NumpyLSTM.load(ensure_npz(model_path, maxlen))
+
+
+def default_backend_name():
+    name = os.environ.get('INFERENCE_BACKEND')
+    if name:
+        return name
+    if BACKEND_CHOICE_PATH.exists():
+        try:
+            return json.loads(BACKEND_CHOICE_PATH.read_text(encoding='utf-8'))['backend']
+        except Exception:
+            pass
+    return DEFAULT_BACKEND
+
+
+def load_backend(name=None, model_path=MODEL_PATH, maxlen=MAXLEN):
+    name = name or default_backend_name()
+    if name not in BACKENDS:
+        raise RuntimeError(f'unknown inference backend {name!r}; choose from {", ".join(BACKENDS)}')
+    return BACKENDS[name](model_path, maxlen)
+
+
+# backends that run from a derived file, and how to produce it
+DERIVED_FILES = {'tflite': ensure_tflite, 'numpy': ensure_npz}
+
+
+def prepare(name, model_path=MODEL_PATH, maxlen=MAXLEN):
+    """Generate the backend's derived file if needed; returns the seconds it took (0 if none)."""
+    ensure = DERIVED_FILES.get(name)
+    if ensure is None:
+        return 0.0
+    start = time.perf_counter()
+    ensure(model_path, maxlen)
+    return time.perf_counter() - start
+
+
+def _rss_mb():
+    try:
+        with open('/proc/self/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    import resource
+    # ru_maxrss is a peak, in KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024.0 * 1024.0) if sys.platform == 'darwin' else rss / 1024.0
+
+
+def bench_one(name, model_path=MODEL_PATH, maxlen=MAXLEN, repeats=20):
+    """Measure one backend in the current process; meant to run in a fresh interpreter
+    after prepare() has generated its derived file.
+    """
+    rng = np.random.default_rng(0)
+    probe = rng.integers(0, TOP_WORDS, size=(max(BENCH_BATCH_SIZES), maxlen)).astype(np.int32)
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    backend = load_backend(name, model_path, maxlen)
+    backend.predict_batch(probe[:1])
+    cold_start = time.perf_counter() - start
+    latency = {}
+    for bs in BENCH_BATCH_SIZES:
+        x = probe[:bs]
+        backend.predict_batch(x)
+        times = []
+        for _ in range(repeats):
+            t = time.perf_counter()
+            backend.predict_batch(x)
+            times.append(time.perf_counter() - t)
+        latency[str(bs)] = float(np.median(times) * 1000.0)
+    return {
+        'backend': name,
+        'cold_start_s': cold_start,
+        'latency_ms': latency,
+        'rss_mb': _rss_mb() - rss_before,
+        'probe': [float(v) for v in backend.predict_batch(probe[:8])],
+    }
+
+
+def benchmark(model_path=MODEL_PATH, names=None, repeats=20):
+    """Run bench_one for each backend in its own subprocess so imports and caches don't leak between them."""
+    def run(*flags):
+        cmd = [sys.executable, str(Path(__file__).resolve()), *flags, '--model', str(model_path), '--repeats', str(repeats)]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            return {'error': (proc.stderr.strip().splitlines() or ['failed'])[-1]}
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+    results = []
+    for name in names or BACKENDS:
+        # conversion/export happens in its own process first, so cold start measures loading
+        # an up-to-date derived file exactly as every later server start will
+        prep = run('--prepare', name)
+        if 'error' in prep:
+            results.append({'backend': name, **prep})
+            continue
+        r = run('--bench-one', name)
+        r.setdefault('backend', name)
+        r['convert_s'] = prep['convert_s']
+        results.append(r)
+
+    reference = next((r['probe'] for r in results if r['backend'] == 'keras' and 'probe' in r), None)
+    for r in results:
+        if 'probe' in r and reference is not None:
+            r['max_abs_diff'] = float(np.max(np.abs(np.asarray(r['probe']) - np.asarray(reference))))
+    return results
+
+
+def pick_default(results):
+    """Fastest single-message backend whose outputs agree with keras (serving scores one message at a time).
+
+    Backends without a max_abs_diff were never checked (keras failed or was not run), so
+    they are not candidates; with no keras reference at all this falls back to DEFAULT_BACKEND.
+    """
+    ok = [r for r in results if 'error' not in r and r.get('max_abs_diff', float('inf')) <= AGREEMENT_TOL]
+    if not ok:
+        return DEFAULT_BACKEND
+    return min(ok, key=lambda r: (r['latency_ms']['1'], r['latency_ms'][str(BENCH_BATCH_SIZES[-1])]))['backend']
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser()
+    p.add_argument('--bench', action='store_true', help='benchmark every backend on this machine')
+    p.add_argument('--write', action='store_true', help=f'save the chosen default to {BACKEND_CHOICE_PATH.name}')
+    p.add_argument('--bench-one', metavar='NAME', help=argparse.SUPPRESS)
+    p.add_argument('--prepare', metavar='NAME', help=argparse.SUPPRESS)
+    p.add_argument('--model', default=str(MODEL_PATH))
+    p.add_argument('--repeats', type=int, default=20)
+    args = p.parse_args()
+
+    if args.prepare:
+        print(json.dumps({'convert_s': prepare(args.prepare, Path(args.model))}))
+    elif args.bench_one:
+        print(json.dumps(bench_one(args.bench_one, Path(args.model), repeats=args.repeats)))
+    elif args.bench:
+        if not Path(args.model).exists():
+            raise SystemExit(f'{args.model} not found. Run hhe.py to train the model')
+        results = benchmark(Path(args.model), repeats=args.repeats)
+        cols = [f'bs={bs} ms' for bs in BENCH_BATCH_SIZES]
+        print(f"{'backend':<12} {'convert s':>9} {'cold s':>8} " + ' '.join(f'{c:>10}' for c in cols) + f" {'rss MB':>8} {'max diff':>9}")
+        for r in results:
+            if 'error' in r:
+                print(f"{r['backend']:<12} error: {r['error']}")
+                continue
+            lat = ' '.join(f"{r['latency_ms'][str(bs)]:>10.2f}" for bs in BENCH_BATCH_SIZES)
+            diff = r.get('max_abs_diff')
+            print(f"{r['backend']:<12} {r['convert_s']:>9.2f} {r['cold_start_s']:>8.2f} {lat} {r['rss_mb']:>8.1f} "
+                  + (f'{diff:>9.1e}' if diff is not None else f"{'-':>9}"))
+        if not any('max_abs_diff' in r for r in results):
+            print('keras reference failed; outputs were not checked, keeping', DEFAULT_BACKEND)
+        choice = pick_default(results)
+        print('Default backend:', choice)
+        if args.write:
+            BACKEND_CHOICE_PATH.write_text(json.dumps({'backend': choice, 'results': results}, indent=2), encoding='utf-8')
+            print('Saved', BACKEND_CHOICE_PATH)
+    else:
+        print('No action provided. Use --bench (optionally with --write)')
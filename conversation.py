@@ -0,0 +1,77 @@
+"""Bounded store of per-conversation LSTM state for incremental chat scoring.
+
+Each conversation keeps the (h, c) state reached after its last message, so a new
+turn only has to run its own tokens through the recurrence (see numpy_lstm.py).
+Entries are evicted least-recently-used first once the store is full, and dropped
+after `ttl` seconds without activity.
+
+Callers must hold lock(conversation_id) from get() to put(), so two turns of the same
+conversation cannot both start from the same state and overwrite each other.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class SessionStore:
+    def __init__(self, max_entries=10000, ttl=1800.0, lock_stripes=256):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # per-conversation serialization via a fixed pool of locks, so the store never
+        # has to track (or evict) one lock object per conversation id
+        self._turn_locks = [threading.Lock() for _ in range(max(1, lock_stripes))]
+        self._entries = OrderedDict()
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+
+    def _expire(self, now):
+        # entries are kept in last-access order, so expired ones sit at the front
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry['updated'] < self.ttl:
+                break
+            self._entries.popitem(last=False)
+            self.evicted_ttl += 1
+
+    def lock(self, conversation_id):
+        """Lock serializing turns of one conversation (shared with a few other ids)."""
+        return self._turn_locks[hash(conversation_id) % len(self._turn_locks)]
+
+    def get(self, conversation_id):
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                return None
+            # keep last-access order and timestamps in step; _expire relies on it
+            entry['updated'] = now
+            self._entries.move_to_end(conversation_id)
+            return entry
+
+    def put(self, conversation_id, entry):
+        with self._lock:
+            now = time.monotonic()
+            entry['updated'] = now
+            self._expire(now)
+            self._entries[conversation_id] = entry
+            self._entries.move_to_end(conversation_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted_lru += 1
+
+    def drop(self, conversation_id):
+        with self._lock:
+            return self._entries.pop(conversation_id, None) is not None
+
+    def stats(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                'sessions': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_s': self.ttl,
+                'evicted_lru': self.evicted_lru,
+                'evicted_ttl': self.evicted_ttl,
+            }
@@ -0,0 +1,64 @@
+"""Check conversation.SessionStore: LRU eviction, TTL expiry and per-conversation locks.
+
+Pure Python, no model needed. TTL checks sleep for a fraction of a second.
+
+Usage:
+  python conversation_test.py
+"""
+import time
+
+from conversation import SessionStore
+
+TTL = 0.2
+
+
+def check_lru_eviction():
+    store = SessionStore(max_entries=2, ttl=60)
+    store.put('a', {'turns': 1})
+    store.put('b', {'turns': 1})
+    assert store.get('a') is not None  # 'a' is now the most recently used
+    store.put('c', {'turns': 1})
+    assert store.get('b') is None, 'least recently used entry must be evicted'
+    assert store.get('a') is not None and store.get('c') is not None
+    stats = store.stats()
+    assert (stats['sessions'], stats['evicted_lru'], stats['evicted_ttl']) == (2, 1, 0), stats
+    print('least recently used conversation evicted when full')
+
+
+def check_ttl_expiry():
+    store = SessionStore(max_entries=10, ttl=TTL)
+    store.put('a', {'turns': 1})
+    time.sleep(TTL * 1.5)
+    assert store.get('a') is None, 'idle entry must expire after ttl'
+    assert store.stats()['evicted_ttl'] == 1
+    print('idle conversation dropped after ttl')
+
+
+def check_ttl_refresh_on_get():
+    store = SessionStore(max_entries=10, ttl=TTL)
+    store.put('a', {'turns': 1})
+    store.put('b', {'turns': 1})
+    time.sleep(TTL * 0.6)
+    assert store.get('a') is not None  # reading counts as activity
+    time.sleep(TTL * 0.6)
+    # 'b' is past its ttl, 'a' was touched 0.6 * ttl ago
+    assert store.get('a') is not None, 'get must refresh the ttl'
+    assert store.get('b') is None
+    print('get refreshes the ttl')
+
+
+def check_drop_and_lock():
+    store = SessionStore(max_entries=10, ttl=60, lock_stripes=4)
+    store.put('a', {'turns': 1})
+    assert store.drop('a') and not store.drop('a')
+    assert store.get('a') is None
+    assert store.lock('a') is store.lock('a'), 'one conversation must always map to the same lock'
+    print('drop removes a conversation; lock() is stable per id')
+
+
+if __name__ == '__main__':
+    check_lru_eviction()
+    check_ttl_expiry()
+    check_ttl_refresh_on_get()
+    check_drop_and_lock()
+    print('OK')
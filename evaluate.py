@@ -0,0 +1,175 @@
+"""Shared evaluation harness for the IMDB sentiment model.
+
+Scoring the 25k IMDB test reviews is the slow part of every metric study, so the
+test-set probabilities are cached in eval_cache/, keyed by the SHA-256 of the model
+file plus the preprocessing settings (vocabulary size, sequence length). Threshold,
+calibration and category studies then reuse them without loading TensorFlow.
+
+Usage:
+  python evaluate.py                                 # evaluate sentiment_model.h5
+  python evaluate.py old_model.h5 sentiment_model.h5 # compare models side by side
+  python evaluate.py --maxlen 300 --refresh          # other preprocessing, ignore cache
+"""
+import argparse
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).parent
+CACHE_DIR = ROOT / 'eval_cache'
+DEFAULT_MODEL = ROOT / 'sentiment_model.h5'
+TOP_WORDS = 10000
+MAXLEN = 200
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_path(model_path, top_words=TOP_WORDS, maxlen=MAXLEN):
+    settings = json.dumps({'top_words': top_words, 'maxlen': maxlen, 'padding': 'pre', 'truncating': 'pre'}, sort_keys=True)
+    settings_key = hashlib.sha256(settings.encode('utf-8')).hexdigest()[:12]
+    return CACHE_DIR / f'{file_sha256(model_path)[:24]}_{settings_key}.npz'
+
+
+def store_probs(model_path, probs, labels, top_words=TOP_WORDS, maxlen=MAXLEN):
+    """Save test-set probabilities for an already-scored model (used by hhe.py after training)."""
+    CACHE_DIR.mkdir(exist_ok=True)
+    out = cache_path(model_path, top_words, maxlen)
+    np.savez_compressed(out, probs=np.asarray(probs, dtype=np.float32).ravel(),
+                        labels=np.asarray(labels, dtype=np.int8).ravel(),
+                        top_words=top_words, maxlen=maxlen)
+    return out
+
+
+def _score_test_set(model_path, top_words, maxlen):
+    from tensorflow.keras.models import load_model
+    from tensorflow.keras.preprocessing.sequence import pad_sequences
+    from tensorflow.keras.datasets import imdb
+
+    print('Loading IMDB test set (this may download if not present)')
+    (_, _), (x_test, y_test) = imdb.load_data(num_words=top_words)
+    x_test = pad_sequences(x_test, maxlen=maxlen)
+    model = load_model(str(model_path))
+    probs = model.predict(x_test, batch_size=256, verbose=1).ravel()
+    return probs, y_test
+
+
+def get_probs(model_path=DEFAULT_MODEL, top_words=TOP_WORDS, maxlen=MAXLEN, refresh=False):
+    """Return (probs, labels) for the IMDB test set, scoring the model only on a cache miss."""
+    model_path = Path(model_path)
+    if not model_path.exists():
+        raise FileNotFoundError(f'{model_path} not found. Run hhe.py to train the model')
+    path = cache_path(model_path, top_words, maxlen)
+    if path.exists() and not refresh:
+        with np.load(path) as d:
+            return d['probs'], d['labels']
+    probs, labels = _score_test_set(model_path, top_words, maxlen)
+    store_probs(model_path, probs, labels, top_words, maxlen)
+    print('Cached test-set probabilities in', path)
+    return probs, labels
+
+
+def threshold_sweep(probs, labels, thresholds=None):
+    """F1/precision/recall at each threshold, computed for all thresholds at once."""
+    if thresholds is None:
+        thresholds = np.linspace(0.01, 0.99, 99)
+    labels = np.asarray(labels).astype(bool)
+    preds = probs[None, :] >= thresholds[:, None]
+    tp = (preds & labels).sum(axis=1)
+    fp = (preds & ~labels).sum(axis=1)
+    fn = (~preds & labels).sum(axis=1)
+    precision = np.where(tp + fp > 0, tp / np.maximum(tp + fp, 1), 0.0)
+    recall = tp / max(int(labels.sum()), 1)
+    f1 = np.where(precision + recall > 0, 2 * precision * recall / np.maximum(precision + recall, 1e-12), 0.0)
+    return {'thresholds': thresholds, 'precision': precision, 'recall': recall, 'f1': f1}
+
+
+def best_threshold(probs, labels):
+    sweep = threshold_sweep(probs, labels)
+    i = int(np.argmax(sweep['f1']))
+    return {'th': float(sweep['thresholds'][i]), 'f1': float(sweep['f1'][i]),
+            'precision': float(sweep['precision'][i]), 'recall': float(sweep['recall'][i])}
+
+
+def calibration(probs, labels, bins=10):
+    """Expected calibration error, Brier score and the reliability table."""
+    labels = np.asarray(labels, dtype=np.float64)
+    edges = np.linspace(0.0, 1.0, bins + 1)
+    idx = np.clip(np.digitize(probs, edges[1:-1]), 0, bins - 1)
+    table = []
+    ece = 0.0
+    for b in range(bins):
+        mask = idx == b
+        n = int(mask.sum())
+        if n == 0:
+            continue
+        conf = float(probs[mask].mean())
+        acc = float(labels[mask].mean())
+        ece += n / len(probs) * abs(conf - acc)
+        table.append({'bin': f'{edges[b]:.1f}-{edges[b + 1]:.1f}', 'n': n, 'mean_prob': conf, 'positive_rate': acc})
+    return {'ece': float(ece), 'brier': float(np.mean((probs - labels) ** 2)), 'bins': table}
+
+
+def category_counts(probs, threshold):
+    """How the test set falls into the UI categories served by flask_app.categorize."""
+    from flask_app import categorize
+    counts = {}
+    for p in probs:
+        _, category, _ = categorize(float(p), threshold)
+        counts[category] = counts.get(category, 0) + 1
+    return counts
+
+
+def summarize(probs, labels):
+    from sklearn.metrics import roc_auc_score
+    best = best_threshold(probs, labels)
+    cal = calibration(probs, labels)
+    return {
+        'n': int(len(probs)),
+        'accuracy@0.5': float(((probs >= 0.5) == labels.astype(bool)).mean()),
+        'roc_auc': float(roc_auc_score(labels, probs)),
+        'best_threshold': best['th'],
+        'best_f1': best['f1'],
+        'ece': cal['ece'],
+        'brier': cal['brier'],
+    }
+
+
+def compare(model_paths, top_words=TOP_WORDS, maxlen=MAXLEN, refresh=False):
+    """Summaries for several model files, scored (or loaded from cache) one after another."""
+    return {str(p): summarize(*get_probs(p, top_words, maxlen, refresh)) for p in model_paths}
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser()
+    p.add_argument('models', nargs='*', default=[str(DEFAULT_MODEL)], help='model files to evaluate')
+    p.add_argument('--top-words', type=int, default=TOP_WORDS)
+    p.add_argument('--maxlen', type=int, default=MAXLEN)
+    p.add_argument('--refresh', action='store_true', help='rescore even if cached probabilities exist')
+    p.add_argument('--calibration', action='store_true', help='print the reliability table for each model')
+    p.add_argument('--categories', action='store_true', help='print UI category counts at the best threshold')
+    args = p.parse_args()
+
+    results = compare(args.models, args.top_words, args.maxlen, args.refresh)
+    cols = ['accuracy@0.5', 'roc_auc', 'best_threshold', 'best_f1', 'ece', 'brier']
+    width = max(len(m) for m in results)
+    print(f"{'model':<{width}}  " + '  '.join(f'{c:>14}' for c in cols))
+    for m, r in results.items():
+        print(f'{m:<{width}}  ' + '  '.join(f'{r[c]:>14.4f}' for c in cols))
+
+    for m in args.models:
+        if args.calibration or args.categories:
+            probs, labels = get_probs(m, args.top_words, args.maxlen)
+            print('\n' + m)
+            if args.calibration:
+                for row in calibration(probs, labels)['bins']:
+                    print(f"  {row['bin']}  n={row['n']:>6}  mean_prob={row['mean_prob']:.3f}  positive_rate={row['positive_rate']:.3f}")
+            if args.categories:
+                print(' ', category_counts(probs, results[m]['best_threshold']))
@@ -1,10 +1,20 @@
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Response, request, jsonify
 import numpy as np
-# TensorFlow/Keras imports are heavy; import them lazily inside functions (get_model/predict)
+# TensorFlow/Keras imports are heavy; they happen lazily inside the inference backends (backends.py)
 import json
+import os
+import threading
+import time
+import uuid
 from pathlib import Path
 from datetime import datetime
 
+import hashed_model
+from admission_control import AdmissionController, DEADLINE_HEADER, SHED_HEADERS, SHED_RESPONSES, deadline_from_header
+from conversation import SessionStore
+from http_cache import CachedPayload, conditional_response
+from backends import load_backend, load_numpy_lstm
+
 app = Flask(__name__)
 
 MODEL_PATH = Path(__file__).parent / 'sentiment_model.h5'
@@ -13,6 +23,18 @@ MAXLEN = 200
 TOP_WORDS = 10000
 THRESH_PATH = Path(__file__).parent / 'threshold_eval.json'
 
+# Conversation sessions for /predict/session (LSTM state kept per conversation id)
+SESSION_MAX_ENTRIES = int(os.environ.get('SESSION_MAX_ENTRIES', '10000'))
+SESSION_TTL_S = float(os.environ.get('SESSION_TTL_S', '1800'))
+
+# Cache-Control max-age (seconds) for the precomputed pages and /api/history
+PAGE_MAX_AGE = int(os.environ.get('PAGE_MAX_AGE', '86400'))
+HISTORY_MAX_AGE = int(os.environ.get('HISTORY_MAX_AGE', '300'))
+HISTORY_PATH = Path(__file__).parent / 'history.json'
+
+# Messages whose share of in-vocabulary tokens is below this go to the hashed n-gram model
+FALLBACK_MIN_COVERAGE = float(os.environ.get('FALLBACK_MIN_COVERAGE', '0.5'))
+
 # Simple HTML chat UI (Bootstrap bubble layout)
 HTML = '''
 <!doctype html>
@@ -184,59 +206,8 @@ HTML = '''
 </html>
 '''
 
-# Load model and word index lazily
-_model = None
-_word_index = None
-
-def get_model():
-    global _model
-    if _model is None:
-        if not MODEL_PATH.exists():
-            raise RuntimeError('Model file not found. Run hhe.py to train and save the model as sentiment_model.h5')
-    # lazy import to avoid importing TensorFlow at module import time
-    try:
-      from tensorflow.keras.models import load_model
-    except Exception:
-      from keras.models import load_model
-    _model = load_model(str(MODEL_PATH))
-    return _model
-
-
-def get_threshold():
-  # if a computed threshold exists from evaluation, use it; otherwise default 0.5
-  if THRESH_PATH.exists():
-    try:
-      j = json.loads(THRESH_PATH.read_text(encoding='utf-8'))
-      th = float(j.get('best_threshold') or j.get('best_th') or j.get('threshold') or 0.5)
-      return th
-    except Exception:
-      return 0.5
-  return 0.5
-
-
-def get_word_index():
-  """Return the raw IMDB word_index (word -> original index)
-  We'll add the +3 offset when converting tokens to sequences so behavior matches imdb.load_data.
-  """
-  global _word_index
-  if _word_index is None:
-    if not WORD_INDEX_PATH.exists():
-      raise RuntimeError('word_index.json not found. Run hhe.py to generate it')
-    raw = json.loads(WORD_INDEX_PATH.read_text())
-    # ensure ints
-    _word_index = {k: int(v) for k, v in raw.items()}
-  return _word_index
-
-
-@app.route('/')
-def index():
-    return render_template_string(HTML)
-
-
-@app.route('/dashboard')
-def dashboard():
-    # lightweight dashboard page that fetches history and predictions
-    dash_html = '''
+# lightweight dashboard page that fetches history and predictions
+DASHBOARD_HTML = '''
     <!doctype html>
     <html>
     <head>
@@ -330,22 +301,162 @@ def dashboard():
     </body>
     </html>
     '''
-    return render_template_string(dash_html)
 
+# Load model and word index lazily
+_model = None
+_word_index = None
+_stepper = None
+_hashed = None
+# concurrent first requests must not each import TensorFlow and load (or export) the model
+_load_lock = threading.Lock()
+sessions = SessionStore(SESSION_MAX_ENTRIES, SESSION_TTL_S)
 
-@app.route('/api/history')
-def api_history():
-    p = Path(__file__).parent / 'history.json'
-    if not p.exists():
-        return jsonify({})
-    return jsonify(json.loads(p.read_text()))
+def get_model():
+    """Inference backend for the LSTM (see backends.py); exposes predict_batch(int32 array)."""
+    global _model
+    if _model is None:
+        with _load_lock:
+            if _model is None:
+                if not MODEL_PATH.exists():
+                    raise RuntimeError('Model file not found. Run hhe.py to train and save the model as sentiment_model.h5')
+                # backends import TensorFlow lazily, and the numpy backend not at all
+                _model = load_backend(model_path=MODEL_PATH, maxlen=MAXLEN)
+    return _model
 
 
-@app.route('/api/predictions')
-def api_predictions():
+def get_threshold():
+  # if a computed threshold exists from evaluation, use it; otherwise default 0.5
+  if THRESH_PATH.exists():
+    try:
+      j = json.loads(THRESH_PATH.read_text(encoding='utf-8'))
+      th = float(j.get('best_threshold') or j.get('best_th') or j.get('threshold') or 0.5)
+      return th
+    except Exception:
+      return 0.5
+  return 0.5
+
+
+def get_word_index():
+  """Return the raw IMDB word_index (word -> original index)
+  We'll add the +3 offset when converting tokens to sequences so behavior matches imdb.load_data.
+  """
+  global _word_index
+  if _word_index is None:
+    if not WORD_INDEX_PATH.exists():
+      raise RuntimeError('word_index.json not found. Run hhe.py to generate it')
+    raw = json.loads(WORD_INDEX_PATH.read_text())
+    # ensure ints
+    _word_index = {k: int(v) for k, v in raw.items()}
+  return _word_index
+
+
+admission = AdmissionController()
+
+
+class InferenceStats:
+    """Vocabulary coverage seen at vectorization time and latency per inference path."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens = 0
+        self.known_tokens = 0
+        self.paths = {}
+
+    def record(self, path, n_tokens, n_known, seconds):
+        with self._lock:
+            self.requests += 1
+            self.tokens += n_tokens
+            self.known_tokens += n_known
+            p = self.paths.setdefault(path, {'count': 0, 'total_s': 0.0, 'max_s': 0.0})
+            p['count'] += 1
+            p['total_s'] += seconds
+            p['max_s'] = max(p['max_s'], seconds)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'coverage_avg': (self.known_tokens / self.tokens) if self.tokens else 1.0,
+                'min_coverage': FALLBACK_MIN_COVERAGE,
+                'paths': {name: {'count': p['count'],
+                                 'latency_ms_avg': p['total_s'] / p['count'] * 1000.0,
+                                 'latency_ms_max': p['max_s'] * 1000.0}
+                          for name, p in self.paths.items()},
+            }
+
+
+inference_stats = InferenceStats()
+
+
+def with_admission(fn, *args):
+  status = admission.acquire(deadline_from_header(request.headers.get(DEADLINE_HEADER)))
+  if status != 'ok':
+    code, error = SHED_RESPONSES[status]
+    resp = jsonify({'error': error})
+    resp.status_code = code
+    resp.headers.update(SHED_HEADERS)
+    return resp
+  try:
+    return fn(*args)
+  finally:
+    admission.release()
+
+
+def get_hashed_model():
+  """Hashed n-gram fallback model, or None if hhe.py has not produced hashed_model.pkl."""
+  global _hashed
+  if _hashed is None and hashed_model.HASHED_MODEL_PATH.exists():
+    with _load_lock:
+      if _hashed is None:
+        _hashed = hashed_model.load()
+  return _hashed
+
+
+def get_stepper():
+  """NumPy copy of the loaded model's weights, used to advance conversation state token by token."""
+  global _stepper
+  if _stepper is None:
+    with _load_lock:
+      if _stepper is None:
+        if not MODEL_PATH.exists():
+          raise RuntimeError('Model file not found. Run hhe.py to train and save the model as sentiment_model.h5')
+        _stepper = load_numpy_lstm(MODEL_PATH, maxlen=MAXLEN)
+  return _stepper
+
+
+# The pages have no template variables, so they are served as precomputed bytes;
+# their source file is this module. /api/history is rebuilt when history.json changes.
+index_page = CachedPayload(__file__, lambda: HTML.encode('utf-8'), 'text/html; charset=utf-8', PAGE_MAX_AGE)
+dashboard_page = CachedPayload(__file__, lambda: DASHBOARD_HTML.encode('utf-8'), 'text/html; charset=utf-8', PAGE_MAX_AGE)
+history_payload = CachedPayload(HISTORY_PATH, lambda: json.dumps(load_history()).encode('utf-8'), 'application/json', HISTORY_MAX_AGE)
+
+
+def cached_response(payload):
+    status, headers, body = conditional_response(payload.current(), request.headers)
+    return Response(body, status=status, headers=headers)
+
+
+@app.route('/')
+def index():
+    return cached_response(index_page)
+
+
+@app.route('/dashboard')
+def dashboard():
+    return cached_response(dashboard_page)
+
+
+def load_history():
+    if not HISTORY_PATH.exists():
+        return {}
+    return json.loads(HISTORY_PATH.read_text())
+
+
+def load_recent_predictions():
     p = Path(__file__).parent / 'predictions.log'
     if not p.exists():
-        return jsonify([])
+        return []
     lines = [l.strip() for l in p.read_text(encoding='utf-8').splitlines() if l.strip()]
     out = []
     for ln in lines[-200:]:
@@ -353,7 +464,17 @@ def api_predictions():
             out.append(json.loads(ln))
         except Exception:
             continue
-    return jsonify(out)
+    return out
+
+
+@app.route('/api/history')
+def api_history():
+    return cached_response(history_payload)
+
+
+@app.route('/api/predictions')
+def api_predictions():
+    return jsonify(load_recent_predictions())
 
 
 @app.route('/predict', methods=['POST'])
@@ -363,12 +484,40 @@ def predict():
   if not text:
     return jsonify({'error': 'empty text'}), 400
 
-  # ensure word_index is loaded
-  try:
-    word_index = get_word_index()
-  except Exception as e:
-    return jsonify({'error': str(e)}), 500
+  return with_admission(run_predict, text)
+
 
+@app.route('/predict/session', methods=['POST'])
+def predict_session():
+  data = request.get_json()
+  text = (data.get('text') or '').strip()
+  if not text:
+    return jsonify({'error': 'empty text'}), 400
+  conversation_id = str(data.get('conversation_id') or uuid.uuid4().hex)
+  return with_admission(run_predict_session, conversation_id, text)
+
+
+@app.route('/predict/session/<conversation_id>', methods=['DELETE'])
+def end_session(conversation_id):
+  return jsonify({'conversation_id': conversation_id, 'dropped': sessions.drop(conversation_id)})
+
+
+@app.route('/api/sessions')
+def api_sessions():
+    return jsonify(sessions.stats())
+
+
+@app.route('/api/admission')
+def api_admission():
+    return jsonify(admission.stats())
+
+
+@app.route('/api/inference')
+def api_inference():
+    return jsonify(inference_stats.stats())
+
+
+def tokenize(text):
   # tokenization (prefer Keras helper, fallback to simple regex)
   try:
     from tensorflow.keras.preprocessing.text import text_to_word_sequence
@@ -379,9 +528,10 @@ def predict():
       import re
       def text_to_word_sequence(s):
         return re.findall(r"[A-Za-z0-9']+", s.lower())
+  return text_to_word_sequence(text)
 
-  tokens = text_to_word_sequence(text)
 
+def tokens_to_sequence(tokens, word_index):
   # Map tokens to imdb indices used in training: mapped = raw_index + 3
   seq = []
   for w in tokens:
@@ -394,24 +544,20 @@ def predict():
       seq.append(2)
     else:
       seq.append(mapped)
+  return seq
 
-  # pad and predict
-  try:
-    from tensorflow.keras.preprocessing.sequence import pad_sequences
-  except Exception:
-    from keras.preprocessing.sequence import pad_sequences
-  padded = pad_sequences([seq], maxlen=MAXLEN)
-  model = get_model()
-  score = float(model.predict(padded)[0][0])
 
-  # debug output (printed to server console)
-  try:
-    print('DEBUG predict:', {'text': text, 'tokens': tokens[:20], 'seq_sample': seq[:20], 'score': score})
-  except Exception:
-    pass
+def pad_sequence(seq, maxlen):
+  # same as keras pad_sequences([seq], maxlen) (pre-padding, pre-truncation) without importing TensorFlow
+  out = np.zeros((1, maxlen), dtype=np.int32)
+  seq = seq[-maxlen:]
+  if seq:
+    out[0, -len(seq):] = seq
+  return out
+
 
+def categorize(score, threshold):
   # decide binary sentiment using evaluated threshold (better than fixed 0.5)
-  threshold = get_threshold()
   sentiment = 'Positive' if score >= threshold else 'Negative'
 
   # detailed multi-level category mapping (for richer color-coded UI)
@@ -435,42 +581,145 @@ def predict():
     category = 'Very Negative'
     color = '#dc2626'
 
-  # Server-side rule: if message contains strong negative words, force Negative
-  NEGATIVE_KEYWORDS = {'hate','terrible','worst','awful','bad','boring','disappoint','dislike','sucks','horrible','trash','stupid','worse','dont',"don't",'no','not'}
-  text_lower = text.lower()
-  has_negative = any(w in tokens or w in text_lower for w in NEGATIVE_KEYWORDS)
-  if has_negative:
-    # force negative prediction for clear negative language
-    sentiment = 'Negative'
-    category = 'Very Negative'
-    color = '#dc2626'
-    # optionally dampen the score so UI reflects negative
-    try:
-      score = float(min(score, 0.2))
-    except Exception:
-      pass
-
   # Server-side rule: treat 'Slightly Positive' as Negative (per user request)
   if category == 'Slightly Positive':
     sentiment = 'Negative'
     category = 'Negative'
     color = '#f87171'
+  return sentiment, category, color
+
+
+NEGATIVE_KEYWORDS = {'hate','terrible','worst','awful','bad','boring','disappoint','dislike','sucks','horrible','trash','stupid','worse','dont',"don't",'no','not'}
+
+
+def has_negative_keyword(text, tokens):
+  text_lower = text.lower()
+  return any(w in tokens or w in text_lower for w in NEGATIVE_KEYWORDS)
+
 
+def score_to_rating(score):
+  # map score (0..1) to a 1-5 product rating (simple linear mapping)
+  rating = int(round(score * 4.0)) + 1
+  return min(5, max(1, rating))
+
+
+def label_prediction(score, text, tokens, threshold):
+  """Apply the category mapping and server-side rules to a raw model score."""
+  sentiment, category, color = categorize(score, threshold)
+  # Server-side rule: if message contains strong negative words, force Negative
+  if has_negative_keyword(text, tokens):
+    sentiment = 'Negative'
+    category = 'Very Negative'
+    color = '#dc2626'
+    # dampen the score so UI reflects negative
+    score = float(min(score, 0.2))
+  return {'sentiment': sentiment, 'score': score, 'category': category, 'color': color, 'rating': score_to_rating(score)}
+
+
+def log_prediction(text, result):
   # server-side logging of predictions for dashboard
   try:
     logp = Path(__file__).parent / 'predictions.log'
-    # map score (0..1) to a 1-5 product rating (simple linear mapping)
-    rating = int(round(score * 4.0)) + 1
-    if rating < 1: rating = 1
-    if rating > 5: rating = 5
-
-    entry = {'time': datetime.utcnow().isoformat(), 'text': text, 'score': score, 'sentiment': sentiment, 'category': category, 'rating': rating}
+    entry = {'time': datetime.utcnow().isoformat(), 'text': text, 'score': result['score'], 'sentiment': result['sentiment'], 'category': result['category'], 'rating': result['rating'], 'path': result.get('path', 'lstm')}
     with logp.open('a', encoding='utf-8') as f:
       f.write(json.dumps(entry) + '\n')
   except Exception:
     pass
 
-  return jsonify({'sentiment': sentiment, 'score': score, 'category': category, 'color': color, 'rating': rating})
+
+def predict_text(text):
+  """Score one message with the model and apply the server-side rules.
+  Raises RuntimeError when the model or word index has not been generated yet.
+  """
+  word_index = get_word_index()
+  tokens = tokenize(text)
+  seq = tokens_to_sequence(tokens, word_index)
+  known = sum(1 for i in seq if i != 2)
+  coverage = known / len(seq) if seq else 1.0
+
+  threshold = get_threshold()
+  # resolve the model before starting the clock so one-time loads don't count as inference latency
+  hashed = get_hashed_model() if coverage < FALLBACK_MIN_COVERAGE else None
+  if hashed is not None:
+    # mostly UNK for the LSTM; the hashed n-grams still see every word
+    path = 'hashed'
+    start = time.perf_counter()
+    raw_score = hashed_model.predict_tokens(hashed, tokens)
+    inference_stats.record(path, len(seq), known, time.perf_counter() - start)
+    # put it on the LSTM's scale so the threshold and category cutoffs mean the same thing
+    score = hashed_model.to_lstm_scale(raw_score, hashed['threshold'], threshold)
+  else:
+    path = 'lstm'
+    model = get_model()
+    padded = pad_sequence(seq, MAXLEN)
+    start = time.perf_counter()
+    raw_score = score = float(model.predict_batch(padded)[0])
+    inference_stats.record(path, len(seq), known, time.perf_counter() - start)
+
+  # debug output (printed to server console)
+  try:
+    print('DEBUG predict:', {'text': text, 'tokens': tokens[:20], 'seq_sample': seq[:20], 'coverage': coverage, 'path': path, 'raw_score': raw_score, 'score': score})
+  except Exception:
+    pass
+
+  result = label_prediction(score, text, tokens, threshold)
+  result['path'] = path
+  return result
+
+
+def predict_session_text(conversation_id, text):
+  """Advance a conversation by one message; returns per-message and cumulative results."""
+  word_index = get_word_index()
+  stepper = get_stepper()
+
+  tokens = tokenize(text)
+  # same window /predict would see for this message alone
+  seq = tokens_to_sequence(tokens, word_index)[-MAXLEN:]
+
+  # hold the conversation's lock from reading its state to storing the new one
+  with sessions.lock(conversation_id):
+    state = sessions.get(conversation_id)
+    # row 0 starts where /predict would for this message alone
+    init_h, init_c = stepper.initial_state(len(seq))
+    if state is None:
+      state = {'h': None, 'c': None, 'turns': 0}
+      h0, c0 = init_h, init_c
+    else:
+      h0, c0 = state['h'], state['c']
+    # row 0: this message on its own, row 1: this message continuing the conversation
+    h, c = stepper.run(seq, np.vstack([init_h, h0]), np.vstack([init_c, c0]))
+    message_score, cumulative_score = (float(x) for x in stepper.score(h))
+
+    state['h'], state['c'] = h[1:2], c[1:2]
+    state['turns'] += 1
+    turn = state['turns']
+    sessions.put(conversation_id, state)
+
+  threshold = get_threshold()
+  message = label_prediction(message_score, text, tokens, threshold)
+  message['path'] = 'lstm'
+  # keyword rules only make sense for the text in front of us, not the whole history
+  sentiment, category, color = categorize(cumulative_score, threshold)
+  cumulative = {'sentiment': sentiment, 'score': cumulative_score, 'category': category, 'color': color, 'rating': score_to_rating(cumulative_score)}
+  return {'conversation_id': conversation_id, 'turn': turn, 'message': message, 'cumulative': cumulative}
+
+
+def run_predict(text):
+  try:
+    result = predict_text(text)
+  except RuntimeError as e:
+    return jsonify({'error': str(e)}), 500
+  log_prediction(text, result)
+  return jsonify(result)
+
+
+def run_predict_session(conversation_id, text):
+  try:
+    result = predict_session_text(conversation_id, text)
+  except RuntimeError as e:
+    return jsonify({'error': str(e)}), 500
+  log_prediction(text, result['message'])
+  return jsonify(result)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,67 @@
+"""Hashed n-gram linear model, the fallback for text the LSTM vocabulary does not cover.
+
+The LSTM only knows the top 10k IMDB words; everything else becomes UNK. This model
+hashes unigrams and bigrams into a fixed feature space, so it has no vocabulary cut-off
+and costs a sparse dot product instead of a 200-step recurrence. It is trained by hhe.py
+on the full-vocabulary IMDB reviews and saved next to the LSTM as hashed_model.pkl.
+
+Input is the token list produced by flask_app.tokenize, joined with spaces, so training
+and serving see identical preprocessing.
+
+Its probabilities are calibrated differently from the LSTM's, so the pickle also stores
+a decision threshold tuned on the model's own held-out IMDB scores; to_lstm_scale() maps
+a score onto the LSTM's scale so the serving threshold and category cutoffs apply.
+"""
+import pickle
+from pathlib import Path
+
+HASHED_MODEL_PATH = Path(__file__).parent / 'hashed_model.pkl'
+N_FEATURES = 2 ** 20
+
+
+def build_pipeline():
+    from sklearn.feature_extraction.text import HashingVectorizer
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.pipeline import make_pipeline
+    # tokens are already split and lowercased upstream; just hash them (and adjacent pairs)
+    vectorizer = HashingVectorizer(n_features=N_FEATURES, ngram_range=(1, 2), token_pattern=r'\S+',
+                                   lowercase=False, alternate_sign=False, norm='l2')
+    clf = SGDClassifier(loss='log_loss', alpha=1e-5, max_iter=30, tol=1e-4, random_state=0)
+    return make_pipeline(vectorizer, clf)
+
+
+def decode_imdb(sequences, word_index):
+    """Turn imdb.load_data id sequences back into space-joined words (ids are raw index + 3)."""
+    reverse = {v + 3: k for k, v in word_index.items()}
+    return [' '.join(reverse[i] for i in seq if i in reverse) for seq in sequences]
+
+
+def train(texts, labels):
+    pipeline = build_pipeline()
+    pipeline.fit(texts, labels)
+    return pipeline
+
+
+def save(pipeline, threshold, path=HASHED_MODEL_PATH):
+    with open(path, 'wb') as f:
+        pickle.dump({'pipeline': pipeline, 'threshold': float(threshold)}, f)
+
+
+def load(path=HASHED_MODEL_PATH):
+    """Returns {'pipeline': ..., 'threshold': ...} as written by save()."""
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def predict_tokens(model, tokens):
+    """Positive-class probability for one tokenized message."""
+    return float(model['pipeline'].predict_proba([' '.join(tokens)])[0, 1])
+
+
+def to_lstm_scale(score, threshold, lstm_threshold):
+    """Piecewise-linear map sending this model's threshold to the LSTM's (and 0, 1 to themselves)."""
+    if score < threshold:
+        return score / threshold * lstm_threshold if threshold > 0 else lstm_threshold
+    if threshold >= 1.0:
+        return 1.0
+    return lstm_threshold + (score - threshold) / (1.0 - threshold) * (1.0 - lstm_threshold)
@@ -0,0 +1,58 @@
+"""Check hashed_model.to_lstm_scale, the map from the fallback model's scores to the LSTM's.
+
+/predict applies the LSTM's threshold and category cutoffs to fallback scores, so the
+map must send 0, the fallback threshold and 1 to 0, the LSTM threshold and 1, and keep
+the ordering in between. Pure Python, no model needed.
+
+Usage:
+  python hashed_model_test.py
+"""
+from hashed_model import decode_imdb, to_lstm_scale
+
+TOL = 1e-9
+
+
+def close(a, b):
+    return abs(a - b) < TOL
+
+
+def check_anchor_points():
+    for threshold, lstm_threshold in ((0.3, 0.5), (0.5, 0.5), (0.7, 0.45), (0.62, 0.38)):
+        assert close(to_lstm_scale(0.0, threshold, lstm_threshold), 0.0)
+        assert close(to_lstm_scale(threshold, threshold, lstm_threshold), lstm_threshold)
+        assert close(to_lstm_scale(1.0, threshold, lstm_threshold), 1.0)
+    print('0, threshold and 1 map to 0, the LSTM threshold and 1')
+
+
+def check_monotonic():
+    threshold, lstm_threshold = 0.7, 0.4
+    scores = [i / 100 for i in range(101)]
+    mapped = [to_lstm_scale(s, threshold, lstm_threshold) for s in scores]
+    assert all(a <= b for a, b in zip(mapped, mapped[1:])), 'mapping must preserve order'
+    # decisions agree: above the fallback threshold <=> above the LSTM threshold
+    for s, m in zip(scores, mapped):
+        assert (s >= threshold) == (m >= lstm_threshold - TOL), s
+    print('mapping is monotonic and preserves the positive/negative decision')
+
+
+def check_degenerate_thresholds():
+    assert close(to_lstm_scale(0.0, 0.0, 0.5), 0.5)
+    assert close(to_lstm_scale(0.3, 0.0, 0.5), 0.5 + 0.3 * 0.5)
+    assert close(to_lstm_scale(0.99, 1.0, 0.5), 0.99 * 0.5)
+    assert close(to_lstm_scale(1.0, 1.0, 0.5), 1.0)
+    print('thresholds of 0 and 1 do not divide by zero')
+
+
+def check_decode_imdb():
+    # imdb.load_data ids are the word index plus 3; 0-2 are padding/start/unknown
+    word_index = {'great': 1, 'movie': 2}
+    assert decode_imdb([[1, 4, 5, 2], [5]], word_index) == ['great movie', 'movie']
+    print('decode_imdb undoes the imdb id offset')
+
+
+if __name__ == '__main__':
+    check_anchor_points()
+    check_monotonic()
+    check_degenerate_thresholds()
+    check_decode_imdb()
+    print('OK')
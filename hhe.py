@@ -36,8 +36,9 @@ model.compile(loss='binary_crossentropy', optimizer=Adam(1e-4), metrics=['accura
 # Train model
 history = model.fit(x_train, y_train, epochs=3, batch_size=128, validation_data=(x_test, y_test))
 
-# Evaluate
-loss, acc = model.evaluate(x_test, y_test)
+# Evaluate (keep the probabilities so evaluate.py/compute_threshold.py can reuse them)
+test_probs = model.predict(x_test, batch_size=256).ravel()
+acc = float(((test_probs >= 0.5) == y_test.astype(bool)).mean())
 print(f"Test Accuracy: {acc*100:.2f}%")
 
 # Save model, word index and training history for serving/dashboard
@@ -46,6 +47,11 @@ WORD_INDEX_PATH = Path(__file__).parent / 'word_index.json'
 HISTORY_PATH = Path(__file__).parent / 'history.json'
 
 model.save(str(MODEL_PATH))
+try:
+    from evaluate import store_probs
+    print('Cached test-set probabilities in', store_probs(MODEL_PATH, test_probs, y_test, top_words=num_words, maxlen=maxlen))
+except Exception as e:
+    print('Could not cache test-set probabilities:', e)
 try:
     word_index = imdb.get_word_index()
     WORD_INDEX_PATH.write_text(json.dumps(word_index))
@@ -57,6 +63,24 @@ try:
 except Exception as e:
     print('Could not save word index or history:', e)
 
+# Train the hashed n-gram fallback for OOV-heavy inputs on the full vocabulary
+# (the LSTM data above has every word outside the top num_words replaced by UNK)
+try:
+    import hashed_model
+    (x_full_train, y_full_train), (x_full_test, y_full_test) = imdb.load_data()
+    full_word_index = imdb.get_word_index()
+    from evaluate import best_threshold
+    hashed = hashed_model.train(hashed_model.decode_imdb(x_full_train, full_word_index), y_full_train)
+    hashed_probs = hashed.predict_proba(hashed_model.decode_imdb(x_full_test, full_word_index))[:, 1]
+    hashed_acc = float(((hashed_probs >= 0.5) == y_full_test.astype(bool)).mean())
+    # its probabilities are not on the LSTM's scale, so it gets its own F1-tuned threshold
+    hashed_best = best_threshold(hashed_probs, y_full_test)
+    hashed_model.save(hashed, hashed_best['th'])
+    print(f"Hashed n-gram fallback accuracy: {hashed_acc*100:.2f}%, threshold {hashed_best['th']:.2f} "
+          f"(F1 {hashed_best['f1']:.3f}), saved to {hashed_model.HASHED_MODEL_PATH}")
+except Exception as e:
+    print('Could not train hashed n-gram fallback:', e)
+
 # Plot accuracy
 plt.plot(history.history['accuracy'], label='Train Acc')
 plt.plot(history.history['val_accuracy'], label='Val Acc')
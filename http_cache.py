@@ -0,0 +1,117 @@
+"""Precomputed HTTP responses with conditional GET support.
+
+A CachedPayload holds the body of a route whose content only depends on one file
+(history.json, or the module holding a constant HTML page). The body, its gzip
+encoding, ETag and Last-Modified are built once and rebuilt only when that file's
+mtime or size changes, so repeat requests cost a stat() and usually end in a 304.
+Framework neutral: flask_app.py and asgi_app.py wrap conditional_response() in
+their own Response types.
+"""
+import gzip
+import hashlib
+import os
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+
+
+class CachedPayload:
+    def __init__(self, source, build, content_type, max_age):
+        self.source = source
+        self.build = build
+        self.content_type = content_type
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._key = object()
+        self._entry = None
+
+    def _source_key(self):
+        try:
+            st = os.stat(self.source)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def current(self):
+        key = self._source_key()
+        entry = self._entry
+        if entry is not None and key == self._key:
+            return entry
+        with self._lock:
+            if self._entry is None or key != self._key:
+                self._entry = self._make_entry(key)
+                self._key = key
+            return self._entry
+
+    def _make_entry(self, key):
+        body = self.build()
+        gz = gzip.compress(body, compresslevel=9, mtime=0)
+        digest = hashlib.sha1(body).hexdigest()[:20]
+        headers = {
+            'Content-Type': self.content_type,
+            'ETag': '"%s"' % digest,
+            'Cache-Control': 'public, max-age=%d' % self.max_age,
+            'Vary': 'Accept-Encoding',
+        }
+        mtime = None
+        if key is not None:
+            mtime = int(key[0] // 1_000_000_000)
+            headers['Last-Modified'] = formatdate(mtime, usegmt=True)
+        # a strong validator identifies one representation, so the gzip body gets its own tag
+        return {'body': body, 'gzip': gz if len(gz) < len(body) else None, 'gzip_etag': '"%s-gz"' % digest,
+                'mtime': mtime, 'headers': headers}
+
+
+def accepts_gzip(accept_encoding):
+    """True if the Accept-Encoding header allows gzip with a non-zero q-value."""
+    gzip_q = star_q = None
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding in ('gzip', 'x-gzip'):
+            gzip_q = q
+        elif coding == '*':
+            star_q = q
+    if gzip_q is None:
+        gzip_q = star_q if star_q is not None else 0.0
+    return gzip_q > 0
+
+
+def _not_modified(entry, etag, request_headers):
+    inm = request_headers.get('If-None-Match')
+    if inm is not None:
+        # If-None-Match wins over If-Modified-Since when both are sent (RFC 9110); only the
+        # tag of the representation being selected counts, since the 304 carries that tag
+        tags = {t.strip() for t in inm.split(',')}
+        return '*' in tags or etag in tags or ('W/' + etag) in tags
+    ims = request_headers.get('If-Modified-Since')
+    if ims and entry['mtime'] is not None:
+        try:
+            return entry['mtime'] <= int(parsedate_to_datetime(ims).timestamp())
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def conditional_response(entry, request_headers):
+    """Return (status, headers, body) for a GET against a cached entry."""
+    headers = dict(entry['headers'])
+    use_gzip = entry['gzip'] is not None and accepts_gzip(request_headers.get('Accept-Encoding'))
+    if use_gzip:
+        headers['ETag'] = entry['gzip_etag']
+    if _not_modified(entry, headers['ETag'], request_headers):
+        del headers['Content-Type']
+        return 304, headers, b''
+    body = entry['body']
+    if use_gzip:
+        body = entry['gzip']
+        headers['Content-Encoding'] = 'gzip'
+    headers['Content-Length'] = str(len(body))
+    return 200, headers, body
@@ -0,0 +1,95 @@
+"""Check http_cache: conditional GET (ETag / Last-Modified) and gzip negotiation.
+
+Builds a CachedPayload over a temporary file, so no server or model is needed.
+
+Usage:
+  python http_cache_test.py
+"""
+import gzip
+import os
+import tempfile
+from email.utils import formatdate
+from pathlib import Path
+
+from http_cache import CachedPayload, accepts_gzip, conditional_response
+
+BODY = b'{"history": "' + b'abc ' * 500 + b'"}'
+
+
+def make_entry(source):
+    return CachedPayload(source, lambda: BODY, 'application/json', 60).current()
+
+
+def check_accepts_gzip():
+    assert accepts_gzip('gzip, deflate')
+    assert accepts_gzip('deflate, GZIP;q=0.5')
+    assert not accepts_gzip(None) and not accepts_gzip('')
+    assert not accepts_gzip('gzip;q=0'), 'q=0 means not acceptable'
+    assert not accepts_gzip('br, gzip;q=0.0')
+    assert accepts_gzip('*'), '* covers gzip'
+    assert not accepts_gzip('*;q=0')
+    assert not accepts_gzip('gzip;q=0, *'), 'an explicit gzip entry overrides *'
+    assert accepts_gzip('identity;q=1, *;q=0.1')
+    print('Accept-Encoding q-values and * honoured')
+
+
+def check_gzip_response(entry):
+    status, headers, body = conditional_response(entry, {'Accept-Encoding': 'gzip'})
+    assert status == 200 and headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(body) == BODY and headers['Content-Length'] == str(len(body))
+    assert headers['ETag'] == entry['gzip_etag'] != entry['headers']['ETag']
+    status, headers, body = conditional_response(entry, {'Accept-Encoding': 'gzip;q=0'})
+    assert status == 200 and 'Content-Encoding' not in headers and body == BODY
+    assert headers['ETag'] == entry['headers']['ETag']
+    print('gzip body served with its own ETag')
+
+
+def check_if_none_match(entry):
+    identity, gz = entry['headers']['ETag'], entry['gzip_etag']
+    status, headers, body = conditional_response(entry, {'If-None-Match': identity})
+    assert (status, body) == (304, b'') and headers['ETag'] == identity
+    assert 'Content-Type' not in headers
+    assert conditional_response(entry, {'If-None-Match': 'W/' + identity})[0] == 304
+    assert conditional_response(entry, {'If-None-Match': '"other", ' + identity})[0] == 304
+    assert conditional_response(entry, {'If-None-Match': '*'})[0] == 304
+    assert conditional_response(entry, {'If-None-Match': gz, 'Accept-Encoding': 'gzip'})[0] == 304
+    # a tag for the other encoding does not validate: the 304 would carry a tag the client never stored
+    assert conditional_response(entry, {'If-None-Match': identity, 'Accept-Encoding': 'gzip'})[0] == 200
+    assert conditional_response(entry, {'If-None-Match': gz})[0] == 200
+    print('If-None-Match validates only the selected representation')
+
+
+def check_if_modified_since(entry):
+    last_modified = entry['headers']['Last-Modified']
+    assert conditional_response(entry, {'If-Modified-Since': last_modified})[0] == 304
+    older = formatdate(entry['mtime'] - 60, usegmt=True)
+    assert conditional_response(entry, {'If-Modified-Since': older})[0] == 200
+    assert conditional_response(entry, {'If-Modified-Since': 'not a date'})[0] == 200
+    # If-None-Match takes precedence when both are sent
+    assert conditional_response(entry, {'If-None-Match': '"other"', 'If-Modified-Since': last_modified})[0] == 200
+    print('If-Modified-Since answered from Last-Modified')
+
+
+def check_rebuild_on_change(source):
+    payload = CachedPayload(source, lambda: Path(source).read_bytes(), 'text/plain', 60)
+    first = payload.current()
+    assert payload.current() is first, 'unchanged source must reuse the entry'
+    Path(source).write_bytes(b'changed')
+    st = os.stat(source)
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 2_000_000_000))
+    second = payload.current()
+    assert second['body'] == b'changed' and second['headers']['ETag'] != first['headers']['ETag']
+    print('entry rebuilt when the source file changes')
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as d:
+        source = Path(d) / 'history.json'
+        source.write_bytes(BODY)
+        entry = make_entry(source)
+        check_accepts_gzip()
+        check_gzip_response(entry)
+        check_if_none_match(entry)
+        check_if_modified_since(entry)
+        check_rebuild_on_change(source)
+    print('OK')
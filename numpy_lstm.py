@@ -0,0 +1,116 @@
+"""Plain NumPy re-implementation of the Embedding -> LSTM -> Dense model trained by hhe.py.
+
+Keras only gives us whole-sequence inference. Running the recurrence ourselves lets
+callers keep the LSTM (h, c) state between calls and feed just the new tokens,
+which is what the conversation endpoint in flask_app.py needs.
+"""
+import numpy as np
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _hard_sigmoid(x):
+    return np.clip(0.2 * x + 0.5, 0.0, 1.0)
+
+
+class NumpyLSTM:
+    def __init__(self, embedding, kernel, recurrent_kernel, bias, dense_w, dense_b,
+                 recurrent_activation='sigmoid', maxlen=200):
+        self.embedding = np.asarray(embedding, dtype=np.float32)
+        self.kernel = np.asarray(kernel, dtype=np.float32)
+        self.recurrent_kernel = np.asarray(recurrent_kernel, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.dense_w = np.asarray(dense_w, dtype=np.float32).reshape(-1)
+        self.dense_b = float(np.asarray(dense_b).reshape(-1)[0])
+        self.units = self.recurrent_kernel.shape[0]
+        self.maxlen = maxlen
+        self._recurrent_act_name = recurrent_activation
+        self._recurrent_act = _hard_sigmoid if recurrent_activation == 'hard_sigmoid' else _sigmoid
+        self._pad_state = None
+
+    @classmethod
+    def from_keras(cls, model, maxlen=200):
+        """Pull the weights out of a loaded Keras model (Embedding, LSTM, Dense)."""
+        by_type = {}
+        for layer in model.layers:
+            by_type.setdefault(type(layer).__name__, layer)
+        try:
+            emb, lstm, dense = by_type['Embedding'], by_type['LSTM'], by_type['Dense']
+        except KeyError as e:
+            raise RuntimeError(f'model has no {e.args[0]} layer; expected the hhe.py architecture')
+        kernel, recurrent_kernel, bias = lstm.get_weights()
+        dense_w, dense_b = dense.get_weights()
+        act = lstm.get_config().get('recurrent_activation', 'sigmoid')
+        return cls(emb.get_weights()[0], kernel, recurrent_kernel, bias, dense_w, dense_b,
+                   recurrent_activation=act, maxlen=maxlen)
+
+    def save(self, path):
+        np.savez(path, embedding=self.embedding, kernel=self.kernel, recurrent_kernel=self.recurrent_kernel,
+                 bias=self.bias, dense_w=self.dense_w, dense_b=np.float32(self.dense_b),
+                 recurrent_activation=self._recurrent_act_name, maxlen=self.maxlen)
+
+    @classmethod
+    def load(cls, path):
+        """Load weights exported by save(); needs only NumPy."""
+        with np.load(path) as d:
+            return cls(d['embedding'], d['kernel'], d['recurrent_kernel'], d['bias'], d['dense_w'], d['dense_b'],
+                       recurrent_activation=str(d['recurrent_activation']), maxlen=int(d['maxlen']))
+
+    def zero_state(self, batch=1):
+        z = np.zeros((batch, self.units), dtype=np.float32)
+        return z, z.copy()
+
+    def initial_state(self, n_tokens=0):
+        """State after the padding /predict puts in front of an `n_tokens` message.
+
+        /predict left-pads every message to `maxlen` with token 0, so running the
+        message from here gives exactly model.predict's score for it. States after
+        every padding length are computed once and cached.
+        """
+        if self._pad_state is None:
+            h, c = self.zero_state()
+            hs, cs = [h], [c]
+            for _ in range(self.maxlen):
+                h, c = self.run([0], h, c)
+                hs.append(h)
+                cs.append(c)
+            self._pad_state = (np.concatenate(hs), np.concatenate(cs))
+        pads = self.maxlen - min(max(n_tokens, 0), self.maxlen)
+        hs, cs = self._pad_state
+        return hs[pads:pads + 1].copy(), cs[pads:pads + 1].copy()
+
+    def run(self, tokens, h, c):
+        """Advance states (h, c) of shape (batch, units) over `tokens`; every row sees the same tokens."""
+        if len(tokens) == 0:
+            return h, c
+        # input projection for all steps in one matmul; only the recurrent part is sequential
+        xw = self.embedding[np.asarray(tokens, dtype=np.int64)] @ self.kernel + self.bias
+        for t in range(xw.shape[0]):
+            h, c = self._step(xw[t], h, c)
+        return h, c
+
+    def predict_batch(self, x):
+        """Score padded int sequences of shape (n, maxlen) from the zero state, like model.predict."""
+        x = np.asarray(x)
+        h, c = self.zero_state(x.shape[0])
+        xw = self.embedding[x] @ self.kernel + self.bias
+        for t in range(xw.shape[1]):
+            h, c = self._step(xw[:, t], h, c)
+        return self.score(h)
+
+    def _step(self, xw_t, h, c):
+        u = self.units
+        z = xw_t + h @ self.recurrent_kernel
+        i = self._recurrent_act(z[:, :u])
+        f = self._recurrent_act(z[:, u:2 * u])
+        g = np.tanh(z[:, 2 * u:3 * u])
+        o = self._recurrent_act(z[:, 3 * u:])
+        c = f * c + i * g
+        h = o * np.tanh(c)
+        return h, c
+
+    def score(self, h):
+        """Sigmoid output of the Dense head, one probability per row of `h`."""
+        return _sigmoid(h @ self.dense_w + self.dense_b)
@@ -0,0 +1,81 @@
+"""Check that numpy_lstm.NumpyLSTM reproduces Keras for the hhe.py architecture.
+
+/predict/session and the numpy inference backend both rely on the hand-written
+recurrence (gate order i/f/c/o, recurrent activation, bias layout) matching Keras.
+Builds a small untrained Embedding -> LSTM -> Dense model and compares outputs.
+
+Usage:
+  python numpy_lstm_test.py
+"""
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from numpy_lstm import NumpyLSTM
+
+VOCAB = 50
+MAXLEN = 12
+TOL = 1e-5
+
+
+def build_model():
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Input, Embedding, LSTM, Dense
+    model = Sequential([
+        Input(shape=(MAXLEN,), dtype='int32'),
+        Embedding(VOCAB, 8),
+        LSTM(6),
+        Dense(1, activation='sigmoid'),
+    ])
+    # non-zero biases so a wrong bias/gate layout cannot cancel out
+    rng = np.random.default_rng(0)
+    model.set_weights([rng.normal(scale=0.5, size=w.shape).astype(np.float32) for w in model.get_weights()])
+    return model
+
+
+def pad(seq):
+    # keras pad_sequences default: pre-padding with 0
+    out = np.zeros((1, MAXLEN), dtype=np.int32)
+    if seq:
+        out[0, -len(seq):] = seq[-MAXLEN:]
+    return out
+
+
+def check_predict_batch(model, stepper):
+    x = np.random.default_rng(1).integers(0, VOCAB, size=(16, MAXLEN)).astype(np.int32)
+    x[:4, :MAXLEN // 2] = 0  # some padded rows
+    expected = model.predict(x, verbose=0).ravel()
+    got = stepper.predict_batch(x)
+    diff = float(np.max(np.abs(got - expected)))
+    assert diff < TOL, f'predict_batch differs from keras by {diff}'
+    print(f'predict_batch matches keras (max diff {diff:.1e})')
+
+
+def check_session_start(model, stepper):
+    # a short message run from initial_state() must score like /predict scores it alone
+    for seq in ([5], [7, 3, 9], list(range(1, MAXLEN + 1))):
+        expected = float(model.predict(pad(seq), verbose=0)[0, 0])
+        h, c = stepper.run(seq, *stepper.initial_state(len(seq)))
+        got = float(stepper.score(h)[0])
+        assert abs(got - expected) < TOL, f'{seq}: session start {got} vs predict {expected}'
+    print('run from initial_state() matches /predict for short messages')
+
+
+def check_roundtrip(stepper):
+    x = np.random.default_rng(2).integers(0, VOCAB, size=(4, MAXLEN))
+    with tempfile.TemporaryDirectory() as d:
+        path = Path(d) / 'weights.npz'
+        stepper.save(path)
+        loaded = NumpyLSTM.load(path)
+    assert np.allclose(loaded.predict_batch(x), stepper.predict_batch(x)), 'npz round trip changed outputs'
+    print('npz export round trip preserves outputs')
+
+
+if __name__ == '__main__':
+    model = build_model()
+    stepper = NumpyLSTM.from_keras(model, maxlen=MAXLEN)
+    check_predict_batch(model, stepper)
+    check_session_start(model, stepper)
+    check_roundtrip(stepper)
+    print('OK')